@@ -0,0 +1,114 @@
+import asyncio
+import contextvars
+import os
+import re
+from typing import Optional
+
+from langgraph.constants import TAG_NOSTREAM
+
+from .llm import get_llm
+
+# Max prompts coalesced into a single LLM call; 1 disables batching.
+REVISION_BATCH_SIZE = max(1, int(os.getenv("REVISION_BATCH_SIZE", "1")))
+
+# How long the first prompt of a batch waits for others to join.
+BATCH_WINDOW_SECONDS = 0.05
+
+_RESPONSE_MARKER = re.compile(r"^--- RESPONSE (\d+) ---[ \t]*$", re.MULTILINE)
+
+# Created lazily so they bind to the server's running event loop.
+_queue: Optional[asyncio.Queue] = None
+_worker: Optional[asyncio.Task] = None
+
+
+async def batched_invoke(prompt: str) -> str:
+    """
+    Send `prompt` to the LLM, coalesced with any other prompts submitted within
+    BATCH_WINDOW_SECONDS into one request (up to REVISION_BATCH_SIZE prompts).
+    Returns this prompt's share of the response text.
+
+    The shared call belongs to no single graph run, so it is made outside the
+    caller's run config and its tokens are not streamed.
+    """
+    global _queue, _worker
+    if _worker is None or _worker.done():
+        _queue = asyncio.Queue()
+        # A fresh context: otherwise the worker (and every batch it spawns)
+        # inherits the first caller's run config — its callbacks, stream
+        # handlers and checkpoint namespace.
+        _worker = asyncio.create_task(
+            _collect_batches(_queue), context=contextvars.Context()
+        )
+
+    future = asyncio.get_running_loop().create_future()
+    _queue.put_nowait((prompt, future))
+    return await future
+
+
+async def _collect_batches(queue: asyncio.Queue) -> None:
+    """Background task: group queued prompts by time window and dispatch them."""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await queue.get()]
+        deadline = loop.time() + BATCH_WINDOW_SECONDS
+        while len(batch) < REVISION_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # Dispatch without blocking the next window
+        asyncio.create_task(_run_batch(batch))
+
+
+async def _run_batch(batch: list[tuple[str, asyncio.Future]]) -> None:
+    llm = get_llm().with_config(tags=[TAG_NOSTREAM])
+    prompts = [prompt for prompt, _ in batch]
+
+    answers: Optional[list] = None
+    if len(prompts) > 1:
+        try:
+            response = await llm.ainvoke(_combine(prompts))
+            answers = _split(response.content, len(prompts))
+        except Exception as e:
+            print(f"[Batcher] Batched call failed: {e}")
+        if answers is None:
+            print(f"[Batcher] Falling back to {len(prompts)} individual calls")
+
+    if answers is None:
+        results = await asyncio.gather(
+            *(llm.ainvoke(prompt) for prompt in prompts), return_exceptions=True
+        )
+        answers = [r if isinstance(r, BaseException) else r.content for r in results]
+
+    for (_, future), answer in zip(batch, answers):
+        if future.done():
+            continue  # caller went away
+        if isinstance(answer, BaseException):
+            future.set_exception(answer)
+        else:
+            future.set_result(answer)
+
+
+def _combine(prompts: list[str]) -> str:
+    header = (
+        f"You will receive {len(prompts)} independent requests. Answer each one "
+        "separately and completely, as if it were the only request.\n"
+        "Begin each answer with a line of the form '--- RESPONSE <n> ---', where "
+        "<n> is the request number, and write nothing outside the answers.\n\n"
+    )
+    return header + "\n\n".join(
+        f"--- REQUEST {i} ---\n{prompt}" for i, prompt in enumerate(prompts, 1)
+    )
+
+
+def _split(text: str, count: int) -> Optional[list[str]]:
+    """Split a combined response by its markers; None if they don't line up."""
+    parts = _RESPONSE_MARKER.split(text)
+    # parts = [preamble, "1", answer1, "2", answer2, ...]
+    numbers = parts[1::2]
+    if numbers != [str(i) for i in range(1, count + 1)]:
+        return None
+    return [answer.strip() for answer in parts[2::2]]
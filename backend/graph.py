@@ -1,8 +1,19 @@
+import functools
+import os
+import re
+
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 
-from .state import AgentState
-from .nodes import researcher_node, writer_node, human_review_node
+from .state import APPROVED, MAX_REVISIONS, AgentState
+from .nodes import (
+    RESEARCH_ASPECTS,
+    research_planner_node,
+    research_subtask_node,
+    aggregate_research_node,
+    writer_node,
+)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -11,26 +22,22 @@ from .nodes import researcher_node, writer_node, human_review_node
 
 def route_human_review(state: AgentState) -> str:
     """
-    Conditional edge called AFTER human_review_node executes.
-    Decides whether to end the graph or send the draft back to the Writer.
+    Conditional edge out of the Writer.  Decides whether to end the graph or
+    send the draft back to the Writer.
+
+    It runs once when the Writer finishes — the Writer consumed the feedback,
+    so the run ends at END with the draft awaiting review — and again when
+    /feedback applies the human's decision via
+    aupdate_state(..., as_node="writer"), which routes to the Writer (a new
+    run) or leaves the graph at END.
     """
     feedback = state.get("human_feedback")
-    revision_count = state.get("revision_count", 0)
-
-    if feedback == "__APPROVED__":
-        print("[Router] Content approved → END")
-        return "end"
-
-    if revision_count >= 5:
-        print(f"[Router] Max revisions reached ({revision_count}) → END")
+    if (
+        not feedback
+        or feedback == APPROVED
+        or state.get("revision_count", 0) >= MAX_REVISIONS
+    ):
         return "end"
-
-    if not feedback:
-        # Should not happen in normal flow; end gracefully.
-        print("[Router] No feedback found → END")
-        return "end"
-
-    print(f"[Router] Revision requested (count={revision_count}) → writer")
     return "writer"
 
 
@@ -38,26 +45,44 @@ def route_human_review(state: AgentState) -> str:
 # Graph construction
 # ─────────────────────────────────────────────────────────────────────────────
 
-# Single shared MemorySaver — persists all thread state in memory.
-_memory = MemorySaver()
+# Checkpoints live in SQLite (out of process) so threads survive a restart and
+# thread state does not accumulate in the server's heap.
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", "checkpoints.db")
 
 
-def create_graph():
+def open_checkpointer():
+    """
+    Async context manager yielding the shared AsyncSqliteSaver.
+    Must be entered inside a running event loop (see server.lifespan).
+    """
+    return AsyncSqliteSaver.from_conn_string(CHECKPOINT_DB)
+
+
+def create_graph(checkpointer: BaseCheckpointSaver):
     workflow = StateGraph(AgentState)
 
     # Register nodes
-    workflow.add_node("researcher", researcher_node)
+    workflow.add_node("research_planner", research_planner_node)
+    # One research node per aspect, e.g. "research_key_facts"
+    research_nodes = []
+    for aspect in RESEARCH_ASPECTS:
+        name = "research_" + re.sub(r"\W+", "_", aspect.lower())
+        workflow.add_node(name, functools.partial(research_subtask_node, aspect=aspect))
+        research_nodes.append(name)
+    workflow.add_node("aggregate_research", aggregate_research_node)
     workflow.add_node("writer", writer_node)
-    workflow.add_node("human_review", human_review_node)
 
-    # Sequential flow: researcher → writer → human_review
-    workflow.set_entry_point("researcher")
-    workflow.add_edge("researcher", "writer")
-    workflow.add_edge("writer", "human_review")
+    # research_planner fans out to the research nodes, which run in parallel
+    # (reading the search results from state) and join at aggregate_research
+    workflow.set_entry_point("research_planner")
+    for name in research_nodes:
+        workflow.add_edge("research_planner", name)
+    workflow.add_edge(research_nodes, "aggregate_research")
+    workflow.add_edge("aggregate_research", "writer")
 
-    # After human_review: either END or back to writer for revision
+    # After writer: either END (draft awaiting review, or done) or back to writer
     workflow.add_conditional_edges(
-        "human_review",
+        "writer",
         route_human_review,
         {
             "end": END,
@@ -65,13 +90,8 @@ def create_graph():
         },
     )
 
-    # Compile with MemorySaver checkpointing.
-    # Graph pauses BEFORE executing "human_review", waiting for human input.
-    return workflow.compile(
-        checkpointer=_memory,
-        interrupt_before=["human_review"],
-    )
-
-
-# Module-level singleton — shared across all API requests.
-graph = create_graph()
+    # Compile with the given checkpointer.
+    # No interrupt: each run ends after a draft, and "awaiting review" is read
+    # from the state (see server._status_of).  There is no separate review
+    # node, so no extra checkpoint of the full draft.
+    return workflow.compile(checkpointer=checkpointer)
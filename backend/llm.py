@@ -1,3 +1,4 @@
+import functools
 import os
 from dotenv import load_dotenv
 from langchain_openrouter import ChatOpenRouter
@@ -5,10 +6,14 @@ from langchain_openrouter import ChatOpenRouter
 load_dotenv()
 
 
+@functools.lru_cache(maxsize=1)
 def get_llm() -> ChatOpenRouter:
     """
     Returns a ChatOpenAI instance configured for OpenRouter.
     CRITICAL: Uses ChatOpenAI (not standard OpenAI classes) with OpenRouter's base URL.
+
+    The instance is cached so every node shares one client (and its HTTP
+    connection pool) instead of rebuilding it on each invocation.
     """
     return ChatOpenRouter(
         model=os.getenv("MODEL_NAME", "google/gemini-2.0-flash-001"),
@@ -1,96 +1,122 @@
-from .state import AgentState
-from .llm import get_llm
-from .tools import search
+import asyncio
+import logging
+import os
 
+from langchain_core.messages import BaseMessage, HumanMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langgraph.constants import TAG_NOSTREAM
 
-# ─────────────────────────────────────────────────────────────────────────────
-# Agent 1 – Researcher
-# ─────────────────────────────────────────────────────────────────────────────
+from .state import APPROVED, AgentState
+from .batcher import REVISION_BATCH_SIZE, batched_invoke
+from .llm import get_llm
+from .tools import asearch
 
-def researcher_node(state: AgentState) -> dict:
-    """
-    Gathers information about the topic and stores structured research notes
-    in the `research_data` key of the state.
-    """
-    llm = get_llm()
-    topic = state["topic"]
+logger = logging.getLogger(__name__)
 
-    print(f"[Researcher] Researching topic: {topic}")
 
-    search_results = search(topic)
+# ─────────────────────────────────────────────────────────────────────────────
+# Agent 1 – Researcher (fan-out: planner → parallel subtasks → aggregator)
+# ─────────────────────────────────────────────────────────────────────────────
 
-    prompt = f"""You are a Lead Researcher. Analyze the following request: {topic}
+# Each aspect is researched by its own concurrent LLM call.
+RESEARCH_ASPECTS: dict[str, str] = {
+    "Key Facts": "the most important factual points about the topic.",
+    "Important Statistics": "quantitative data, figures, market sizes, growth rates.",
+    "Current Trends": "what is happening right now in this space.",
+    "Key Insights": "deeper observations or expert opinions.",
+    "Potential Article Angles": "2-3 compelling directions for the final article.",
+}
+
+RESEARCH_SUBTASK_TMPL = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """You are a Lead Researcher.
+Do NOT write the article itself. Only provide organised research notes.
+Be comprehensive, accurate, and specific.""",
+        ),
+        (
+            "human",
+            """Analyze the following request: {topic}
 
 Here is the available research data gathered from external sources:
 {search_results}
 
-Based on this information, produce well-structured research notes that include:
-1. Key Facts – the most important factual points about the topic.
-2. Important Statistics – quantitative data, figures, market sizes, growth rates.
-3. Current Trends – what is happening right now in this space.
-4. Key Insights – deeper observations or expert opinions.
-5. Potential Article Angles – 2-3 compelling directions for the final article.
-
-Do NOT write the article itself. Only provide organised research notes.
-Be comprehensive, accurate, and specific."""
+Based on this information, produce research notes covering ONLY this aspect:
+{aspect} – {aspect_description}""",
+        ),
+    ]
+)
 
-    response = llm.invoke(prompt)
-    research_data = response.content
 
-    print(f"[Researcher] Research complete ({len(research_data)} chars)")
+async def research_planner_node(state: AgentState) -> dict:
+    """
+    Runs the external search once and stores the results in state, where the
+    per-aspect research subtasks (run concurrently after it) read them.
+    """
+    topic = state["topic"]
 
-    return {
-        "research_data": research_data,
-        "messages": state.get("messages", [])
-        + [{"role": "researcher", "content": research_data}],
-    }
+    logger.debug("[Researcher] Researching topic: %s", topic)
 
+    return {"search_results": await asearch(topic)}
 
-# ─────────────────────────────────────────────────────────────────────────────
-# Agent 2 – Writer
-# ─────────────────────────────────────────────────────────────────────────────
 
-def writer_node(state: AgentState) -> dict:
+async def research_subtask_node(state: AgentState, aspect: str) -> dict:
     """
-    Writes (or revises) a blog-post draft based on research_data.
-    If human_feedback is present (and not the approval sentinel), it revises
-    the previous draft according to that feedback.
+    Produces research notes for a single aspect (bound per node in
+    create_graph).  Results are appended to `research_notes` through the
+    merge_notes reducer on AgentState.
     """
     llm = get_llm()
-    topic = state["topic"]
-    research_data = state.get("research_data", "")
-    human_feedback = state.get("human_feedback")
-    draft = state.get("draft", "")
-    revision_count = state.get("revision_count", 0)
 
-    print(f"[Writer] Writing draft (revision_count={revision_count})")
+    response = await (RESEARCH_SUBTASK_TMPL | llm).ainvoke(
+        {
+            "topic": state["topic"],
+            "search_results": state["search_results"],
+            "aspect": aspect,
+            "aspect_description": RESEARCH_ASPECTS[aspect],
+        }
+    )
 
-    if human_feedback and human_feedback != "__APPROVED__":
-        # ── Revision mode ──────────────────────────────────────────────────
-        prompt = f"""You are a Senior Editor. You have received feedback on your draft and must revise it.
+    logger.debug("[Researcher] %s complete (%d chars)", aspect, len(response.content))
 
-Topic: {topic}
+    return {"research_notes": [f"## {aspect}\n\n{response.content}"]}
 
-Research Notes:
-{research_data}
 
-Previous Draft:
-{draft}
+async def aggregate_research_node(state: AgentState) -> dict:
+    """
+    Stitches the per-aspect notes into the single `research_data` document
+    consumed by the Writer, then clears the notes and search results so later
+    checkpoints don't carry the research twice.
+    """
+    research_data = "\n\n".join(state.get("research_notes", []))
 
-Human Feedback: {human_feedback}
+    logger.debug("[Researcher] Research complete (%d chars)", len(research_data))
+
+    return {"research_data": research_data, "research_notes": None, "search_results": ""}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Agent 2 – Writer
+# ─────────────────────────────────────────────────────────────────────────────
 
-Please revise the draft to fully address the feedback provided.
+WRITER_SYSTEM_PROMPT = """You are a Senior Editor. You write and revise blog posts based only on the research notes provided.
 Maintain a professional, engaging tone and keep the article well-structured.
 Format the output in Markdown with proper headings and sections."""
-        revision_count += 1
-    else:
-        # ── Initial draft mode ─────────────────────────────────────────────
-        prompt = f"""You are a Senior Editor. Write a comprehensive blog post based on the research notes below.
 
-Topic: {topic}
+# Static prefix first (system + research), variable part last, so every
+# revision of a thread re-sends an identical, cacheable prefix.
+_WRITER_PREFIX = [
+    ("system", WRITER_SYSTEM_PROMPT),
+    ("human", "Topic: {topic}\n\nResearch Notes:\n{research_data}"),
+]
 
-Research Notes:
-{research_data}
+WRITER_INITIAL_TMPL = ChatPromptTemplate.from_messages(
+    _WRITER_PREFIX
+    + [
+        (
+            "human",
+            """Write a comprehensive blog post based on the research notes above.
 
 Write a well-structured, engaging blog post that:
 1. Opens with a compelling introduction that hooks the reader.
@@ -99,33 +125,140 @@ Write a well-structured, engaging blog post that:
 4. Includes practical takeaways or insights for the reader.
 5. Closes with a strong conclusion summarising the key points.
 
-Format the output in Markdown. Aim for ~600–900 words."""
+Aim for ~600–900 words.""",
+        )
+    ]
+)
 
-    response = llm.invoke(prompt)
-    new_draft = response.content
+WRITER_REVISE_TMPL = ChatPromptTemplate.from_messages(
+    _WRITER_PREFIX
+    + [
+        (
+            "human",
+            """You have received feedback on your draft and must revise it.
 
-    print(f"[Writer] Draft complete ({len(new_draft)} chars)")
+Previous Draft:
+{draft}
 
-    return {
-        "draft": new_draft,
-        "revision_count": revision_count,
-        "messages": state.get("messages", [])
-        + [{"role": "writer", "content": new_draft}],
-    }
+Human Feedback: {human_feedback}
 
+Please revise the draft to fully address the feedback provided.""",
+        )
+    ]
+)
 
-# ─────────────────────────────────────────────────────────────────────────────
-# Human Review Node (virtual interrupt point)
-# ─────────────────────────────────────────────────────────────────────────────
 
-def human_review_node(state: AgentState) -> dict:
+def _cacheable(message: BaseMessage) -> HumanMessage:
+    """
+    Re-wrap a formatted message as a text block marked for provider-side
+    prompt caching.  The text must stay byte-identical across revisions.
     """
-    Virtual node representing the human review step.
+    return HumanMessage(
+        content=[
+            {
+                "type": "text",
+                "text": message.content,
+                "cache_control": {"type": "ephemeral"},
+            }
+        ]
+    )
+
+
+# Number of concurrent draft samples per Writer run; the first to finish wins.
+WRITER_PARALLELISM = max(1, int(os.getenv("WRITER_PARALLELISM", "1")))
+
+# Per-sample nudges appended to the variable message (the cached prefix is untouched).
+WRITER_SAMPLE_HINTS = [
+    "",
+    "\n\nFavour concrete examples and practical detail.",
+    "\n\nFavour a concise, punchy style.",
+]
 
-    The graph is compiled with interrupt_before=["human_review"], so execution
-    PAUSES before this node runs.  After the human provides feedback via the
-    API (updating `human_feedback` in state), the graph resumes and this node
-    executes — it is a no-op; all routing logic lives in the conditional edge.
+
+async def _first_completed(calls):
+    """
+    Await the first call that succeeds and cancel the others.
+    Re-raises the first error if every call fails.
+    """
+    pending = {asyncio.ensure_future(call) for call in calls}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def writer_node(state: AgentState) -> dict:
     """
-    print(f"[Human Review] Routing with feedback: {state.get('human_feedback', 'none')}")
-    return {}
+    Writes (or revises) a blog-post draft based on research_data.
+    If human_feedback is present (and not the approval sentinel), it revises
+    the previous draft according to that feedback.
+    """
+    llm = get_llm()
+    topic = state["topic"]
+    research_data = state.get("research_data", "")
+    human_feedback = state.get("human_feedback")
+    draft = state.get("draft", "")
+    revision_count = state.get("revision_count", 0)
+
+    logger.debug("[Writer] Writing draft (revision_count=%d)", revision_count)
+
+    revising = bool(human_feedback) and human_feedback != APPROVED
+
+    if revising:
+        messages = WRITER_REVISE_TMPL.format_messages(
+            topic=topic,
+            research_data=research_data,
+            draft=draft,
+            human_feedback=human_feedback,
+        )
+        revision_count += 1
+    else:
+        messages = WRITER_INITIAL_TMPL.format_messages(
+            topic=topic, research_data=research_data
+        )
+
+    if revising and REVISION_BATCH_SIZE > 1:
+        # Revisions from concurrent threads share one LLM request; the batch
+        # prompt is plain text, so the cacheable message structure is dropped.
+        # The shared call is not token-streamed; the draft arrives via /state.
+        new_draft = await batched_invoke("\n\n".join(m.content for m in messages))
+    else:
+        system, research, task = messages
+        prefix = [system, _cacheable(research)]
+
+        if WRITER_PARALLELISM == 1:
+            new_draft = (await llm.ainvoke(prefix + [task])).content
+        else:
+            # Speculative samples are not token-streamed: the winner is only known
+            # once it has finished, so interleaved partial drafts would be noise.
+            sampler = llm.with_config(tags=[TAG_NOSTREAM])
+            winner = await _first_completed(
+                sampler.ainvoke(
+                    prefix
+                    + [
+                        HumanMessage(
+                            task.content + WRITER_SAMPLE_HINTS[i % len(WRITER_SAMPLE_HINTS)]
+                        )
+                    ]
+                )
+                for i in range(WRITER_PARALLELISM)
+            )
+            new_draft = winner.content
+
+    logger.debug("[Writer] Draft complete (%d chars)", len(new_draft))
+
+    return {
+        "draft": new_draft,
+        "revision_count": revision_count,
+        "human_feedback": None,  # consumed; the draft now awaits fresh review
+    }
@@ -1,28 +1,118 @@
 import asyncio
+import json
+import os
+import re
 import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 from typing import Optional
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from langgraph.checkpoint.base.id import UUID
 from pydantic import BaseModel
 
 # Load .env before importing graph (which imports llm, which reads env vars)
 load_dotenv()
 
-from .graph import graph  # noqa: E402
+from .graph import create_graph, open_checkpointer  # noqa: E402
+from .nodes import writer_node  # noqa: E402
+from .state import APPROVED, MAX_REVISIONS  # noqa: E402
+
+# Compiled graph — built in lifespan() once the checkpointer connection is open,
+# then shared across all API requests.
+graph = None
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Per-thread Writer token queues (fed by background tasks, drained by /stream)
+# Each run creates its own queue and drops it when it ends; a `None` item
+# marks the end of the run for a client still draining it.
+# ─────────────────────────────────────────────────────────────────────────────
+
+_stream_queues: dict[str, asyncio.Queue] = {}
+
+# Seconds between SSE keep-alives while the Writer has not produced a token.
+STREAM_KEEPALIVE_SECONDS = 15
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Per-thread change notifications for long-polling /state
+# Each waiting long-poll registers its own event; all of a thread's events are
+# set (and dropped) whenever its state may have changed, and a long-poll that
+# times out removes its own.
+# ─────────────────────────────────────────────────────────────────────────────
+
+_thread_events: dict[str, set[asyncio.Event]] = {}
+
+# Upper bound on how long a single /state long-poll may block.
+LONG_POLL_MAX_SECONDS = 30
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Speculative revisions — drafts for likely feedback, written while the human
+# is still reviewing.  Keyed by thread_id; each entry records the checkpoint
+# it was computed from so a stale speculation is never applied.
+# ─────────────────────────────────────────────────────────────────────────────
+
+SPECULATIVE_REVISIONS = os.getenv("SPECULATIVE_REVISIONS", "").lower() in ("1", "true", "yes")
+
+# Offered to the reviewer as one-click options ("suggestions" in /state);
+# only a request for one of these exact prompts reuses its speculative draft.
+SPECULATIVE_FEEDBACK = [
+    "Make the introduction shorter.",
+    "Add more statistics and data.",
+]
+
+_speculative_cache: dict[str, tuple[str, dict[str, asyncio.Task]]] = {}
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Thread eviction — a background reaper drops checkpoints and per-thread
+# bookkeeping for every thread in the checkpointer once it has gone idle.
+# ─────────────────────────────────────────────────────────────────────────────
+
+REAP_INTERVAL_SECONDS = 5 * 60
+# uuid6 timestamps count from the Gregorian epoch; this is 1970-01-01 in them.
+_UUID_EPOCH_TICKS = 0x01B21DD213814000
+# Finished / failed threads are kept this long after their last checkpoint so
+# clients can still read them.
+FINISHED_THREAD_TTL_SECONDS = 30 * 60
+# Threads never completed (e.g. abandoned mid-review) are dropped this long
+# after their last checkpoint.
+ABANDONED_THREAD_TTL_SECONDS = 24 * 60 * 60
 
 # ─────────────────────────────────────────────────────────────────────────────
-# Per-thread error tracking (populated by background tasks on failure)
+# Background run registry — at most one graph run per thread at a time.
+# Holding the reference also keeps the task from being garbage-collected.
+# Like the stream queues and speculative drafts above, this is per-process, so
+# the API must run as a single uvicorn worker.
 # ─────────────────────────────────────────────────────────────────────────────
 
-_thread_errors: dict[str, str] = {}
+_tasks: dict[str, asyncio.Task] = {}
+
+# Threads whose /feedback request is currently being applied.
+_feedback_in_flight: set[str] = set()
 
 # ─────────────────────────────────────────────────────────────────────────────
 # App setup
 # ─────────────────────────────────────────────────────────────────────────────
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global graph
+    async with open_checkpointer() as checkpointer:
+        graph = create_graph(checkpointer)
+        reaper = asyncio.create_task(_reap_threads())
+        try:
+            yield
+        finally:
+            reaper.cancel()
+
+
 app = FastAPI(
+    lifespan=lifespan,
+    # orjson: faster than json.dumps on the hot /state path, and emits UTF-8
+    # drafts without \uXXXX escaping
+    default_response_class=ORJSONResponse,
     title="Human-in-the-Loop Agent API",
     description="Multi-agent content generation system with human review powered by LangGraph + OpenRouter.",
     version="1.0.0",
@@ -55,34 +145,285 @@ class FeedbackRequest(BaseModel):
 # Background graph runners
 # ─────────────────────────────────────────────────────────────────────────────
 
+def _is_running(thread_id: str) -> bool:
+    task = _tasks.get(thread_id)
+    return task is not None and not task.done()
+
+
+def _spawn_run(thread_id: str, coro) -> None:
+    """Register `coro` as the thread's background run (caller checks _is_running)."""
+    task = asyncio.create_task(coro)
+    _tasks[thread_id] = task
+
+    def _forget(done: asyncio.Task) -> None:
+        if _tasks.get(thread_id) is done:
+            del _tasks[thread_id]
+        if not done.cancelled() and done.exception() is not None:
+            # Runners catch graph errors themselves; this is anything that escaped
+            print(f"[Graph] Background run for {thread_id} crashed: {done.exception()}")
+
+    task.add_done_callback(_forget)
+
+
+def _notify_state_change(thread_id: str) -> None:
+    """Wake every /state long-poll currently waiting on this thread."""
+    for event in _thread_events.pop(thread_id, ()):
+        event.set()
+
+
+async def _stream_graph(graph_input: Optional[dict], config: dict) -> None:
+    """Drive the graph, forwarding Writer tokens to the thread's stream queue."""
+    thread_id: str = config["configurable"]["thread_id"]
+    # Registered before the first await, i.e. as soon as the run task starts
+    queue: asyncio.Queue = asyncio.Queue()
+    _stream_queues[thread_id] = queue
+    try:
+        async for mode, chunk in graph.astream(
+            graph_input, config, stream_mode=["values", "messages"]
+        ):
+            if mode == "values":
+                _notify_state_change(thread_id)  # a node just completed
+                continue
+            message, metadata = chunk
+            if metadata.get("langgraph_node") != "writer":
+                continue  # only the draft is streamed, not research notes
+            if isinstance(message.content, str) and message.content:
+                queue.put_nowait(message.content)
+    finally:
+        queue.put_nowait(None)
+        if _stream_queues.get(thread_id) is queue:
+            del _stream_queues[thread_id]
+
+
+async def _record_error(config: dict, exc: Exception) -> None:
+    """
+    Persist a background-task failure in the thread's checkpointed state, so
+    /state reports it for as long as the thread is kept.
+    """
+    try:
+        state = await graph.aget_state(config)
+        # Attribute the update to the node that failed (the one still pending);
+        # leaving it to LangGraph is ambiguous after the parallel research step.
+        as_node = state.next[0] if state.next else None
+        await graph.aupdate_state(config, {"error": str(exc)}, as_node=as_node)
+    except Exception as update_exc:
+        print(f"[Graph] Could not record error: {update_exc}")
+
+
 async def _run_graph(topic: str, config: dict) -> None:
-    """Start a fresh graph run from the initial state until the first interrupt."""
+    """Start a fresh graph run from the initial state up to the first draft."""
     thread_id: str = config["configurable"]["thread_id"]
     initial_state = {
         "topic": topic,
+        "search_results": "",
+        "research_notes": [],
         "research_data": "",
         "draft": "",
         "human_feedback": None,
         "revision_count": 0,
-        "messages": [],
+        "error": None,
     }
     try:
-        async for _ in graph.astream(initial_state, config, stream_mode="values"):
-            pass  # Runs until interrupt_before=["human_review"] fires
+        # Runs until the Writer's first draft (the run then ends awaiting review)
+        await _stream_graph(initial_state, config)
+        await _speculate(config)
     except Exception as exc:
         print(f"[Graph] Error during initial run: {exc}")
-        _thread_errors[thread_id] = str(exc)  # expose via /state; do NOT re-raise
+        await _record_error(config, exc)  # expose via /state; do NOT re-raise
+    finally:
+        _notify_state_change(thread_id)  # interrupted, finished or failed
 
 
 async def _resume_graph(config: dict) -> None:
-    """Resume a previously interrupted graph run (after human feedback is set)."""
+    """Run the Writer again after /feedback routed the thread back to it."""
     thread_id: str = config["configurable"]["thread_id"]
     try:
-        async for _ in graph.astream(None, config, stream_mode="values"):
-            pass  # Runs until next interrupt or END
+        # Runs until the revised draft is written (or END)
+        await _stream_graph(None, config)
+        await _speculate(config)
     except Exception as exc:
         print(f"[Graph] Error during resume: {exc}")
-        _thread_errors[thread_id] = str(exc)  # expose via /state; do NOT re-raise
+        await _record_error(config, exc)  # expose via /state; do NOT re-raise
+    finally:
+        _notify_state_change(thread_id)  # interrupted, finished or failed
+
+
+def _status_of(state) -> str:
+    """Map a graph StateSnapshot to the status reported by /state."""
+    if not state or not state.values:
+        return "starting"
+    if state.values.get("error"):
+        return "error"
+
+    # Nodes waiting to execute, or tasks of a step that has not been
+    # checkpointed yet (e.g. the input checkpoint while the planner runs).
+    if state.next or state.tasks:
+        return "running"
+
+    # The run is at END.  The graph never interrupts, so "awaiting review" is
+    # inferred: a fresh draft whose feedback the Writer consumed is waiting
+    # for review; otherwise the human's decision (APPROVED, or the revision
+    # limit) ended the graph.
+    if state.values.get("human_feedback") is None and state.values.get("draft"):
+        return "interrupted"
+    return "finished"
+
+
+def _thread_status(thread_id: str, state) -> str:
+    """
+    Status reported by /state: as _status_of, except that a paused thread with
+    a live background run (e.g. a speculative revision being applied) is still
+    running.
+    """
+    status = _status_of(state)
+    if status == "interrupted" and _is_running(thread_id):
+        return "running"
+    return status
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Speculative revisions
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _normalise(text: str) -> str:
+    """Lower-cased words only, so case and punctuation don't prevent a match."""
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+def _discard_speculation(thread_id: str) -> None:
+    entry = _speculative_cache.pop(thread_id, None)
+    if entry is not None:
+        for task in entry[1].values():
+            task.cancel()
+
+
+async def _speculate(config: dict) -> None:
+    """
+    If the run just paused for review, start Writer revisions for the canned
+    SPECULATIVE_FEEDBACK prompts in the background (hidden behind think-time).
+    """
+    thread_id: str = config["configurable"]["thread_id"]
+    _discard_speculation(thread_id)
+    if not SPECULATIVE_REVISIONS:
+        return
+
+    state = await graph.aget_state(config)
+    # route_human_review ends the graph once MAX_REVISIONS is reached
+    if _status_of(state) != "interrupted" or state.values.get("revision_count", 0) >= MAX_REVISIONS:
+        return
+
+    _speculative_cache[thread_id] = (
+        state.config["configurable"]["checkpoint_id"],
+        {
+            fb: asyncio.create_task(writer_node({**state.values, "human_feedback": fb}))
+            for fb in SPECULATIVE_FEEDBACK
+        },
+    )
+
+
+async def _take_speculation(config: dict, feedback_text: str) -> Optional[asyncio.Task]:
+    """
+    Return the Writer task speculated for `feedback_text` on the current
+    checkpoint (it may still be running), or None on a miss.  Always clears
+    the entry.
+    """
+    thread_id: str = config["configurable"]["thread_id"]
+    entry = _speculative_cache.get(thread_id)
+    if entry is None:
+        return None
+    checkpoint_id, tasks = entry
+
+    state = await graph.aget_state(config)
+    task = None
+    if state.config["configurable"].get("checkpoint_id") == checkpoint_id:
+        wanted = _normalise(feedback_text)
+        task = next(
+            (tasks.pop(fb) for fb in list(tasks) if _normalise(fb) == wanted), None
+        )
+    _discard_speculation(thread_id)
+    return task
+
+
+async def _apply_speculation(config: dict, speculation: asyncio.Task, feedback_text: str) -> None:
+    """
+    Apply a speculative revision as if the Writer had just run, once it is
+    written; if it failed, run the revision normally instead.
+    """
+    thread_id: str = config["configurable"]["thread_id"]
+    try:
+        try:
+            speculated = await speculation
+        except Exception as exc:
+            print(f"[Graph] Speculative revision failed: {exc}")
+            speculated = None
+
+        if speculated is not None:
+            # The graph stays paused for review; no need to resume it
+            await graph.aupdate_state(config, speculated, as_node="writer")
+        else:
+            await graph.aupdate_state(
+                config, {"human_feedback": feedback_text}, as_node="writer"
+            )
+            await _stream_graph(None, config)
+        await _speculate(config)
+    except Exception as exc:
+        print(f"[Graph] Error during revision: {exc}")
+        await _record_error(config, exc)  # expose via /state; do NOT re-raise
+    finally:
+        _notify_state_change(thread_id)  # interrupted, finished or failed
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Thread eviction
+# ─────────────────────────────────────────────────────────────────────────────
+
+async def _evict_thread(thread_id: str) -> None:
+    """Delete the thread's checkpoints and every in-process entry for it."""
+    await graph.checkpointer.adelete_thread(thread_id)
+    _discard_speculation(thread_id)
+    _notify_state_change(thread_id)  # releases any waiting long-poll
+
+
+def _checkpoint_time(checkpoint_id: str) -> datetime:
+    """Creation time encoded in a (uuid6) checkpoint id."""
+    ticks = UUID(checkpoint_id).time  # 100 ns intervals since 1582-10-15
+    return datetime.fromtimestamp((ticks - _UUID_EPOCH_TICKS) / 1e7, timezone.utc)
+
+
+async def _last_checkpoint_times() -> dict[str, datetime]:
+    """Timestamp of each thread's latest checkpoint."""
+    saver = graph.checkpointer
+    await saver.setup()
+    # One indexed query instead of loading every checkpoint: ids are
+    # time-ordered, so each thread's MAX(checkpoint_id) is its latest.
+    async with saver.lock, saver.conn.execute(
+        "SELECT thread_id, MAX(checkpoint_id) FROM checkpoints GROUP BY thread_id"
+    ) as cursor:
+        rows = await cursor.fetchall()
+    return {thread_id: _checkpoint_time(checkpoint_id) for thread_id, checkpoint_id in rows}
+
+
+async def _reap_threads() -> None:
+    """Background task: periodically evict finished and abandoned threads."""
+    while True:
+        await asyncio.sleep(REAP_INTERVAL_SECONDS)
+        try:
+            last_checkpoint_at = await _last_checkpoint_times()
+        except Exception as exc:
+            print(f"[Graph] Failed to list threads for eviction: {exc}")
+            continue
+        now = datetime.now(timezone.utc)
+        for thread_id, checkpointed_at in last_checkpoint_at.items():
+            idle = (now - checkpointed_at).total_seconds()
+            if idle < FINISHED_THREAD_TTL_SECONDS or _is_running(thread_id):
+                continue
+            try:
+                config = {"configurable": {"thread_id": thread_id}}
+                status = _status_of(await graph.aget_state(config))
+                if status in ("finished", "error") or idle >= ABANDONED_THREAD_TTL_SECONDS:
+                    await _evict_thread(thread_id)
+            except Exception as exc:
+                print(f"[Graph] Failed to evict thread {thread_id}: {exc}")
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -99,42 +440,73 @@ async def start(request: StartRequest):
     thread_id = str(uuid.uuid4())
     config = {"configurable": {"thread_id": thread_id}}
 
-    # Fire-and-forget: graph runs until interrupt_before=["human_review"]
-    asyncio.create_task(_run_graph(request.topic, config))
+    # Background run: graph runs until the Writer's first draft
+    _spawn_run(thread_id, _run_graph(request.topic, config))
 
     return {"thread_id": thread_id}
 
 
 @app.get("/state/{thread_id}")
-async def get_state(thread_id: str):
+async def get_state(
+    thread_id: str,
+    response: Response,
+    wait: float = 0,
+    since: Optional[str] = None,
+    since_len: Optional[int] = None,
+    since_rev: Optional[int] = None,
+    if_none_match: Optional[str] = Header(default=None),
+):
     """
     Return current graph state for the given thread.
+
+    Conditional requests: the response carries an `ETag` (the checkpoint id);
+    sending it back in `If-None-Match` yields `304 Not Modified` while the
+    thread's state is unchanged.
+
+    Draft deltas: a client holding the first `since_len` characters of the
+    draft for revision `since_rev` receives only `draft_delta` (the rest of
+    the draft) instead of `draft`.  `draft_len` is always included.
+
+    Long-polling: when `since` is given and still equals the current status,
+    the request blocks for up to `wait` seconds (capped at
+    LONG_POLL_MAX_SECONDS) until a node completes or the run stops.
+
     Status values:
       - "starting"     → graph not yet checkpointed (still spinning up)
       - "running"      → researcher / writer is currently executing
-      - "interrupted"  → paused before human_review; draft is ready for review
+      - "interrupted"  → the run ended with a draft ready for review
       - "finished"     → graph completed (approved or max revisions reached)
       - "error"        → background task failed; see the "error" field for details
     """
     config = {"configurable": {"thread_id": thread_id}}
 
-    # Surface any background-task exception immediately
-    if thread_id in _thread_errors:
-        return {
-            "draft": "",
-            "status": "error",
-            "revision_count": 0,
-            "research_data": "",
-            "error": _thread_errors[thread_id],
-        }
+    if since is not None and wait > 0:
+        # Register before checking so a change in between is not missed
+        event = asyncio.Event()
+        waiters = _thread_events.setdefault(thread_id, set())
+        waiters.add(event)
+        try:
+            if since == _thread_status(thread_id, await graph.aget_state(config)):
+                await asyncio.wait_for(
+                    event.wait(), timeout=min(wait, LONG_POLL_MAX_SECONDS)
+                )
+        except asyncio.TimeoutError:
+            pass  # unchanged — report the current state anyway
+        finally:
+            # Unknown or idle threads are never notified; don't leave entries behind
+            waiters.discard(event)
+            if not waiters and _thread_events.get(thread_id) is waiters:
+                del _thread_events[thread_id]
 
     try:
         state = await graph.aget_state(config)
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
+    status = _thread_status(thread_id, state)
+
     # No checkpoint yet (graph still starting up)
-    if not state or not state.values:
+    if status == "starting":
         return {
             "draft": "",
             "status": "starting",
@@ -142,36 +514,99 @@ async def get_state(thread_id: str):
             "research_data": "",
         }
 
-    next_nodes = state.next  # tuple of node names waiting to execute
-
-    if "human_review" in next_nodes:
-        status = "interrupted"
-    elif not next_nodes:
-        status = "finished"
-    else:
-        status = "running"
-
-    return {
-        "draft": state.values.get("draft", ""),
+    # The checkpoint alone doesn't capture a live run over a paused thread,
+    # so that answer is not cacheable
+    if status == _status_of(state):
+        etag = f'"{state.config["configurable"]["checkpoint_id"]}"'
+        if if_none_match == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+
+    draft = state.values.get("draft", "")
+    revision_count = state.values.get("revision_count", 0)
+    body = {
         "status": status,
-        "revision_count": state.values.get("revision_count", 0),
+        "revision_count": revision_count,
         "research_data": state.values.get("research_data", ""),
+        "draft_len": len(draft),
     }
+    # A draft is written whole once per revision, so within one revision the
+    # client's prefix is either empty or already the full draft.
+    if since_rev == revision_count and since_len is not None and 0 <= since_len <= len(draft):
+        body["draft_delta"] = draft[since_len:]
+    else:
+        body["draft"] = draft
+    # One-click revision requests (see SPECULATIVE_FEEDBACK)
+    if SPECULATIVE_REVISIONS and status == "interrupted" and revision_count < MAX_REVISIONS:
+        body["suggestions"] = SPECULATIVE_FEEDBACK
+    # Surface any background-task exception recorded in state
+    if status == "error":
+        body["error"] = state.values["error"]
+    return body
+
+
+@app.get("/stream/{thread_id}")
+async def stream(thread_id: str):
+    """
+    Server-Sent Events stream of Writer tokens for the thread's current run.
+    Each `data:` line carries one JSON-encoded text chunk.  A final `end`
+    event is sent once the run pauses for review, finishes, or fails — or
+    right away when no run for the thread is active in this process.
+    """
+    queue = _stream_queues.get(thread_id)
+
+    async def event_stream():
+        while queue is not None:
+            try:
+                chunk = await asyncio.wait_for(
+                    queue.get(), timeout=STREAM_KEEPALIVE_SECONDS
+                )
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if chunk is None:
+                break
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "event: end\ndata: {}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
 
 
 @app.post("/feedback")
 async def feedback(request: FeedbackRequest):
     """
-    Submit human feedback for the interrupted graph.
+    Submit human feedback on the draft awaiting review.  The decision is
+    applied as if the Writer had just finished, so route_human_review sends
+    the thread back to the Writer or leaves it at END.
 
     action="approve"  → marks content as approved; graph runs to END.
     action="revise"   → injects feedback_text; graph re-runs the Writer.
+
+    Returns status "already_running" (and changes nothing) while a previous
+    submission for the thread is still being applied or its revision is running.
     """
+    # A duplicate submission (e.g. a double-click) must not race the run it started
+    if _is_running(request.thread_id) or request.thread_id in _feedback_in_flight:
+        return {"status": "already_running", "message": "The Writer is already working…"}
+
+    # Claimed before the first await so a concurrent duplicate sees it
+    _feedback_in_flight.add(request.thread_id)
+    try:
+        return await _apply_feedback(request)
+    finally:
+        _feedback_in_flight.discard(request.thread_id)
+
+
+async def _apply_feedback(request: FeedbackRequest) -> dict:
     config = {"configurable": {"thread_id": request.thread_id}}
 
     if request.action == "approve":
-        await graph.aupdate_state(config, {"human_feedback": "__APPROVED__"})
-        asyncio.create_task(_resume_graph(config))
+        _discard_speculation(request.thread_id)
+        # Applied as the Writer so route_human_review re-evaluates → END
+        await graph.aupdate_state(
+            config, {"human_feedback": APPROVED}, as_node="writer"
+        )
+        _notify_state_change(request.thread_id)
         return {"status": "approved", "message": "Content approved. Finalising…"}
 
     elif request.action == "revise":
@@ -180,10 +615,20 @@ async def feedback(request: FeedbackRequest):
                 status_code=400,
                 detail="feedback_text is required for action='revise'.",
             )
+        feedback_text = request.feedback_text.strip()
+
+        speculation = await _take_speculation(config, feedback_text)
+        if speculation is not None:
+            # Applied in the background: the pre-written draft may not be done yet
+            _spawn_run(request.thread_id, _apply_speculation(config, speculation, feedback_text))
+            return {"status": "revising", "message": "Revision requested. Writer is working…"}
+
+        # Applied as the Writer so route_human_review re-evaluates → writer
+        # (or END once the revision limit is reached); then run it.
         await graph.aupdate_state(
-            config, {"human_feedback": request.feedback_text.strip()}
+            config, {"human_feedback": feedback_text}, as_node="writer"
         )
-        asyncio.create_task(_resume_graph(config))
+        _spawn_run(request.thread_id, _resume_graph(config))
         return {"status": "revising", "message": "Revision requested. Writer is working…"}
 
     else:
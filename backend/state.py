@@ -1,10 +1,23 @@
-from typing import TypedDict, List, Optional
+from typing import Annotated, TypedDict, List, Optional
+
+# `human_feedback` sentinel meaning the human approved the draft.
+APPROVED = "__APPROVED__"
+
+# Revision limit; route_human_review ends the graph once it is reached.
+MAX_REVISIONS = 5
+
+
+def merge_notes(existing: List[str], new: Optional[List[str]]) -> List[str]:
+    """Reducer for `research_notes`: appends, or clears the notes when given None."""
+    return [] if new is None else existing + new
 
 
 class AgentState(TypedDict):
     topic: str                       # The initial user input
+    search_results: str              # Planner's search results for the subtasks; cleared once aggregated
+    research_notes: Annotated[List[str], merge_notes]  # Per-aspect notes from parallel subtasks; cleared once aggregated
     research_data: str               # Output from Researcher
     draft: str                       # Output from Writer
     human_feedback: Optional[str]    # Input from Human
     revision_count: int              # To prevent infinite loops
-    messages: List[dict]             # Conversation history (for debug)
+    error: Optional[str]             # Set by the server when a background run fails
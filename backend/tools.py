@@ -1,42 +1,190 @@
+import asyncio
+import functools
+import hashlib
 import os
+import time
+from collections import OrderedDict
+from typing import Optional
 
+try:
+    import diskcache
+except ImportError:  # optional — in-process cache only
+    diskcache = None
 
-def search(query: str) -> str:
-    """
-    Search for information about a topic.
-    Priority: Tavily (if API key set) -> DuckDuckGo -> Mock data fallback.
-    """
-    tavily_key = os.getenv("TAVILY_API_KEY")
-
-    # 1. Try Tavily first
-    if tavily_key:
-        try:
-            from langchain_tavily import TavilySearch
-
-            tool = TavilySearch(max_results=5)
-            results = tool.invoke(query)
-            if isinstance(results, list):
-                formatted = "\n\n".join(
-                    [
-                        f"Source: {r.get('url', 'N/A')}\n{r.get('content', '')}"
-                        for r in results
-                    ]
-                )
-                return formatted
-            return str(results)
-        except Exception as e:
-            print(f"[Tools] Tavily search failed: {e}")
-
-    # 2. Try DuckDuckGo
+try:
+    from langchain_tavily import TavilySearch
+except ImportError:
+    TavilySearch = None
+
+try:
+    from langchain_community.tools import DuckDuckGoSearchRun
+except ImportError:
+    DuckDuckGoSearchRun = None
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Search result cache (in-process LRU + optional on-disk diskcache)
+# Mock fallback data is never cached.
+# ─────────────────────────────────────────────────────────────────────────────
+
+SEARCH_CACHE_SIZE = 512
+SEARCH_CACHE_TTL_SECONDS = 24 * 60 * 60
+
+_memory_cache: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+
+
+@functools.lru_cache(maxsize=1)
+def _disk_cache():
+    """Shared diskcache.Cache, opened on first use, or None if unavailable."""
+    if diskcache is None:
+        return None
+    try:
+        return diskcache.Cache(os.getenv("SEARCH_CACHE_DIR", "/tmp/search_cache"))
+    except Exception as e:
+        print(f"[Tools] Disk cache unavailable: {e}")
+        return None
+
+
+def _cache_key(query: str) -> str:
+    """Normalise case and whitespace so trivially different queries share an entry."""
+    return " ".join(query.lower().split())
+
+
+# diskcache is synchronous (SQLite + files): only ever call these via to_thread.
+def _disk_get(key: str) -> Optional[str]:
+    cache = _disk_cache()
+    return cache.get(hashlib.sha256(key.encode()).hexdigest()) if cache is not None else None
+
+
+def _disk_put(key: str, result: str) -> None:
+    cache = _disk_cache()
+    if cache is not None:
+        cache.set(
+            hashlib.sha256(key.encode()).hexdigest(),
+            result,
+            expire=SEARCH_CACHE_TTL_SECONDS,
+        )
+
+
+async def _cache_get(key: str) -> Optional[str]:
+    entry = _memory_cache.get(key)
+    if entry is not None:
+        expires_at, result = entry
+        if expires_at > time.monotonic():
+            _memory_cache.move_to_end(key)
+            return result
+        del _memory_cache[key]
+
+    if diskcache is not None:
+        result = await asyncio.to_thread(_disk_get, key)
+        if result is not None:
+            _memory_put(key, result)
+            return result
+    return None
+
+
+def _memory_put(key: str, result: str) -> None:
+    _memory_cache[key] = (time.monotonic() + SEARCH_CACHE_TTL_SECONDS, result)
+    _memory_cache.move_to_end(key)
+    if len(_memory_cache) > SEARCH_CACHE_SIZE:
+        _memory_cache.popitem(last=False)
+
+
+async def _cache_put(key: str, result: str) -> None:
+    _memory_put(key, result)
+    if diskcache is not None:
+        await asyncio.to_thread(_disk_put, key, result)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Search
+# ─────────────────────────────────────────────────────────────────────────────
+
+@functools.lru_cache(maxsize=1)
+def _tavily_tool():
+    """Shared TavilySearch instance, or None if unavailable / no API key set."""
+    if TavilySearch is None or not os.getenv("TAVILY_API_KEY"):
+        return None
+    try:
+        return TavilySearch(max_results=5)
+    except Exception as e:
+        print(f"[Tools] Tavily unavailable: {e}")
+        return None
+
+
+@functools.lru_cache(maxsize=1)
+def _ddg_tool():
+    """Shared DuckDuckGoSearchRun instance, or None if unavailable."""
+    if DuckDuckGoSearchRun is None:
+        return None
+    try:
+        return DuckDuckGoSearchRun()
+    except Exception as e:
+        print(f"[Tools] DuckDuckGo unavailable: {e}")
+        return None
+
+
+def _format_tavily(results) -> str:
+    if isinstance(results, list):
+        return "\n\n".join(
+            f"Source: {r.get('url', 'N/A')}\n{r.get('content', '')}" for r in results
+        )
+    return str(results)
+
+
+async def _tavily_asearch(tool, query: str) -> str:
     try:
-        from langchain_community.tools import DuckDuckGoSearchRun
+        return _format_tavily(await tool.ainvoke(query))
+    except Exception as e:
+        print(f"[Tools] Tavily search failed: {e}")
+        raise
+
 
-        tool = DuckDuckGoSearchRun()
-        return tool.invoke(query)
+async def _ddg_asearch(tool, query: str) -> str:
+    try:
+        return await tool.ainvoke(query)
     except Exception as e:
         print(f"[Tools] DuckDuckGo search failed: {e}")
+        raise
+
+
+async def asearch(query: str) -> str:
+    """
+    Search for information about a topic without blocking the event loop.
+    Tavily (if API key set) and DuckDuckGo are raced; the first successful
+    result wins and the slower call is cancelled.  Falls back to mock data if
+    both fail.  Real results are cached per normalised query.
+    """
+    key = _cache_key(query)
+    cached = await _cache_get(key)
+    if cached is not None:
+        return cached
+
+    providers = []
+    if (tavily := _tavily_tool()) is not None:
+        providers.append(_tavily_asearch(tavily, query))
+    if (ddg := _ddg_tool()) is not None:
+        providers.append(_ddg_asearch(ddg, query))
+
+    pending = {asyncio.ensure_future(p) for p in providers}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    result = task.result()
+                    await _cache_put(key, result)
+                    return result
+    finally:
+        for task in pending:
+            task.cancel()
+
+    # Mock data fallback — prevents crashing when no tool is available
+    return _mock_search(query)
+
 
-    # 3. Mock data fallback — prevents crashing when no tool is available
+def _mock_search(query: str) -> str:
     print(f"[Tools] Using mock data for: {query}")
     return f"""Mock research data for '{query}':
 
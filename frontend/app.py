@@ -1,4 +1,4 @@
-import time
+import json
 
 import requests
 import streamlit as st
@@ -9,6 +9,9 @@ import streamlit as st
 
 BACKEND_URL = "http://localhost:8000"
 
+# How long the backend may hold a /state long-poll open waiting for a change
+LONG_POLL_SECONDS = 10
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Page config
 # ─────────────────────────────────────────────────────────────────────────────
@@ -32,6 +35,8 @@ defaults = {
     "topic": "",
     "error": None,
     "graph_error": None,   # error message from a failed background graph task
+    "etag": None,          # ETag of the last /state response (for If-None-Match)
+    "suggestions": [],     # one-click revision requests offered by the backend
 }
 for key, value in defaults.items():
     if key not in st.session_state:
@@ -41,9 +46,22 @@ for key, value in defaults.items():
 # Helper functions
 # ─────────────────────────────────────────────────────────────────────────────
 
+def get_session() -> requests.Session:
+    """
+    This browser session's HTTP session, so its backend calls reuse keep-alive
+    connections.  Kept per user in session_state: requests.Session is not
+    thread-safe, and a long-lived /stream would hold a shared pooled connection.
+    """
+    if "http_session" not in st.session_state:
+        session = requests.Session()
+        session.headers.update({"Connection": "keep-alive"})
+        st.session_state.http_session = session
+    return st.session_state.http_session
+
+
 def api_start(topic: str) -> bool:
     try:
-        resp = requests.post(f"{BACKEND_URL}/start", json={"topic": topic}, timeout=10)
+        resp = get_session().post(f"{BACKEND_URL}/start", json={"topic": topic}, timeout=10)
         resp.raise_for_status()
         data = resp.json()
         st.session_state.thread_id = data["thread_id"]
@@ -52,6 +70,7 @@ def api_start(topic: str) -> bool:
         st.session_state.polling = True
         st.session_state.draft = ""
         st.session_state.revision_count = 0
+        st.session_state.etag = None
         st.session_state.error = None
         return True
     except Exception as exc:
@@ -59,16 +78,41 @@ def api_start(topic: str) -> bool:
         return False
 
 
-def api_poll() -> None:
+def api_poll(wait: float = 0) -> None:
+    """
+    Fetch /state.  With `wait`, the backend holds the request until the status
+    changes from the one we last saw (or `wait` seconds elapse).
+
+    Only changes are transferred: an unchanged state answers 304 to our ETag,
+    and a draft we already hold comes back as an (empty) `draft_delta`.
+    """
+    params = {
+        "since_len": len(st.session_state.draft),
+        "since_rev": st.session_state.revision_count,
+    }
+    if wait:
+        params.update(since=st.session_state.status, wait=wait)
+    headers = {"If-None-Match": st.session_state.etag} if st.session_state.etag else None
     try:
-        resp = requests.get(
-            f"{BACKEND_URL}/state/{st.session_state.thread_id}", timeout=10
+        resp = get_session().get(
+            f"{BACKEND_URL}/state/{st.session_state.thread_id}",
+            params=params,
+            headers=headers,
+            timeout=10 + wait,
         )
+        if resp.status_code == 304:
+            st.session_state.error = None
+            return
         resp.raise_for_status()
         data = resp.json()
+        st.session_state.etag = resp.headers.get("ETag")
         st.session_state.status = data["status"]
-        st.session_state.draft = data.get("draft", "")
+        if "draft_delta" in data:
+            st.session_state.draft += data["draft_delta"]
+        else:
+            st.session_state.draft = data.get("draft", "")
         st.session_state.revision_count = data.get("revision_count", 0)
+        st.session_state.suggestions = data.get("suggestions", [])
         st.session_state.error = None
         if data["status"] == "error":
             st.session_state.graph_error = data.get("error", "Unknown error")
@@ -76,6 +120,37 @@ def api_poll() -> None:
         st.session_state.error = f"Polling error: {exc}"
 
 
+def api_stream(placeholder) -> None:
+    """
+    Render Writer tokens from /stream into `placeholder` as they arrive.
+    Returns when the backend sends the `end` event (run paused, finished or
+    failed, or no run to stream); the caller then polls /state for the
+    authoritative draft.
+    """
+    text = ""
+    event = "message"
+    try:
+        with get_session().get(
+            f"{BACKEND_URL}/stream/{st.session_state.thread_id}",
+            stream=True,
+            timeout=(10, 60),
+        ) as resp:
+            resp.raise_for_status()
+            # chunk_size=None yields data as soon as each chunk arrives
+            for line in resp.iter_lines(chunk_size=None, decode_unicode=True):
+                if not line:
+                    event = "message"
+                elif line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    if event == "end":
+                        break
+                    text += json.loads(line[len("data:"):])
+                    placeholder.markdown(text)
+    except Exception as exc:
+        st.session_state.error = f"Streaming error: {exc}"
+
+
 def api_feedback(action: str, feedback_text: str = "") -> bool:
     try:
         payload = {
@@ -83,7 +158,7 @@ def api_feedback(action: str, feedback_text: str = "") -> bool:
             "action": action,
             "feedback_text": feedback_text if action == "revise" else None,
         }
-        resp = requests.post(f"{BACKEND_URL}/feedback", json=payload, timeout=10)
+        resp = get_session().post(f"{BACKEND_URL}/feedback", json=payload, timeout=10)
         resp.raise_for_status()
         st.session_state.status = "running"
         st.session_state.polling = True
@@ -165,7 +240,13 @@ elif st.session_state.status in ("starting", "running") or st.session_state.poll
                 )
             st.caption(f"Thread ID: `{st.session_state.thread_id}`")
 
-        time.sleep(2)
+        # Show the draft as the Writer produces it; blocks until the run pauses
+        with st.container(border=True):
+            draft_placeholder = st.empty()
+        api_stream(draft_placeholder)
+        # Returns at once if the run already paused; otherwise (no run to
+        # stream from this worker, or the stream failed) waits for a change
+        api_poll(wait=LONG_POLL_SECONDS)
         st.rerun()
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -216,6 +297,13 @@ elif st.session_state.status == "interrupted":
                 st.info("Feedback submitted. The Writer is revising the draft…")
                 st.rerun()
 
+        # Requests the backend has already started drafting — answered fastest
+        for suggestion in st.session_state.suggestions:
+            if st.button(suggestion, use_container_width=True):
+                if api_feedback("revise", suggestion):
+                    st.info("Feedback submitted. The Writer is revising the draft…")
+                    st.rerun()
+
 # ─────────────────────────────────────────────────────────────────────────────
 # STATE: Error — graph task failed
 # ─────────────────────────────────────────────────────────────────────────────